@@ -1,10 +1,22 @@
 # rpi_broker.py
 # Run: python3 rpi_broker.py
 import json
+import orjson
 import time
+import queue
+import socket
+import asyncio
+import logging
 import threading
+import httpx
+from logging.handlers import QueueHandler, QueueListener
 import requests
-from flask import Flask, render_template_string, request, redirect, url_for, flash
+import sseclient
+from functools import lru_cache
+from requests.adapters import HTTPAdapter, Retry
+from flask import Flask, Response, request, redirect, url_for, flash, jsonify, session
+from markupsafe import Markup, escape
+from waitress import serve
 import paho.mqtt.client as mqtt
 import os
 
@@ -21,8 +33,29 @@ with open(CONFIG_PATH, "r") as f:
 FIREBASE_URL = cfg["firebase"]["database_url"].rstrip("/")
 MQTT_BROKER = cfg["mqtt"]["broker_ip"]
 MQTT_PORT = int(cfg["mqtt"].get("port", 1883))
-ALLOWED_UIDS = set(u.upper() for u in cfg.get("allowed_uids", []))
+# frozenset: immutable (safe to share across threads) with the same O(1) lookup
+ALLOWED_UIDS = frozenset(u.upper() for u in cfg.get("allowed_uids", []))
 DEVICES = cfg["devices"]
+# Per-scan console banners are skippable in production ("log_nfc": false)
+LOG_NFC = bool(cfg.get("log_nfc", True))
+# Per-message traffic dump is off by default; formatting every payload
+# costs more than parsing it at burst rates ("log_mqtt": true to enable)
+LOG_MQTT = bool(cfg.get("log_mqtt", False))
+
+# -------------------------
+# Logging
+# -------------------------
+# Log records go through a queue; the QueueListener thread does the actual
+# terminal write so MQTT/worker threads never block on console I/O. Lazy
+# %s formatting means records below the active level cost nothing.
+_log_q = queue.Queue()
+logging.basicConfig(
+    level=logging.DEBUG if LOG_MQTT else logging.INFO,
+    handlers=[QueueHandler(_log_q)]
+)
+_log_listener = QueueListener(_log_q, logging.StreamHandler())
+_log_listener.start()
+log = logging.getLogger("rpi_broker")
 
 # Topics - UPDATED TO MATCH ESP32
 TOPIC_NFC_SCAN = "esp/nfc/scan"              # ESP publishes NFC scans here
@@ -36,48 +69,202 @@ TOPIC_LIGHT_STATUS = "esp/light/status"
 TOPIC_LIGHT_CMD = "esp/light/cmd"
 
 # Simple in-memory state (mirrors config devices)
+# Writers (paho callback, queue workers, stream thread) hold state_lock
+# around each mutate+snapshot so concurrent updates cannot tear or race the
+# snapshot copy. Flask threads stay lock-free: they only read
+# `state_snapshot`, a fresh copy whose rebind is atomic under the GIL.
 state = {
     "door_lock": dict(DEVICES.get("door_lock", {})),
     "room_control": dict(DEVICES.get("room_control", {}))
 }
+state_lock = threading.RLock()  # writers only; readers never take it
+state_version = 0  # bumped on every snapshot; basis for ETags and SSE pushes
+state_snapshot = {key: dict(node) for key, node in state.items()}
+state_snapshot["_version"] = 0
+state_cond = threading.Condition()  # fired after every snapshot rebuild
+
+def publish_snapshot():
+    """Rebuild the reader-facing snapshot after mutating state."""
+    global state_snapshot, state_version
+    with state_lock:
+        state_version += 1
+        new_snapshot = {key: dict(node) for key, node in state.items()}
+        new_snapshot["_version"] = state_version
+        state_snapshot = new_snapshot
+    with state_cond:
+        state_cond.notify_all()
 
 # -------------------------
 # Firebase helpers
 # -------------------------
+# Shared session with a connection pool: keep-alive means the TLS handshake
+# to Firebase happens once, not on every request.
+# Payloads are serialized with orjson (C-backed, much faster than stdlib json
+# on the Pi) and sent as raw bytes so requests skips its own encoder.
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+fb_session = requests.Session()
+fb_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
+
+@lru_cache(maxsize=64)
+def _url(path):
+    return f"{FIREBASE_URL}{path}.json"
+
 def fb_put(path, payload):
     """
     PUT data to Firebase RTDB (overwrites). path: e.g. /devices/door_lock.json
     Note: this uses unauthenticated REST. Secure your DB in production.
     """
-    url = f"{FIREBASE_URL}{path}.json"
     try:
-        r = requests.put(url, json=payload, timeout=5)
+        r = fb_session.put(_url(path), data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=5)
         r.raise_for_status()
         return r.json()
     except Exception as e:
-        print("[FB PUT ERROR]", e)
+        log.error("[FB PUT ERROR] %s", e)
         return None
 
 def fb_patch(path, payload):
-    url = f"{FIREBASE_URL}{path}.json"
     try:
-        r = requests.patch(url, json=payload, timeout=5)
+        r = fb_session.patch(_url(path), data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=5)
         r.raise_for_status()
         return r.json()
     except Exception as e:
-        print("[FB PATCH ERROR]", e)
+        log.error("[FB PATCH ERROR] %s", e)
         return None
 
 def fb_get(path):
-    url = f"{FIREBASE_URL}{path}.json"
     try:
-        r = requests.get(url, timeout=5)
+        r = fb_session.get(_url(path), timeout=5)
         r.raise_for_status()
         return r.json()
     except Exception as e:
-        print("[FB GET ERROR]", e)
+        log.error("[FB GET ERROR] %s", e)
         return None
 
+# -------------------------
+# Batched Firebase writes
+# -------------------------
+# Sensor messages can arrive faster than one HTTPS round trip to Firebase
+# completes, so instead of a PATCH per MQTT message we coalesce updates per
+# path and let a background worker flush them all in a single multi-path
+# PATCH against the database root. The worker runs its own asyncio loop
+# with an HTTP/2 httpx client, so flushes ride one multiplexed keep-alive
+# connection and overlap instead of serializing per round trip.
+FLUSH_INTERVAL = 0.5  # seconds between flushes when no immediate flush is requested
+
+pending_updates = {}             # firebase path -> merged partial payload
+pending_lock = threading.Lock()
+_flush_loop = None               # asyncio loop of the flush thread, set at startup
+_flush_wakeup = None             # asyncio.Event living on that loop
+
+def enqueue(path, payload):
+    """Queue a partial update for path; it is merged into the next batched PATCH."""
+    with pending_lock:
+        pending_updates.setdefault(path, {}).update(payload)
+
+def flush_now():
+    """Wake the flush worker immediately (used for access events where latency matters)."""
+    if _flush_loop is not None:
+        _flush_loop.call_soon_threadsafe(_flush_wakeup.set)
+
+def flatten_to_multipath(snapshot):
+    """
+    Convert {"/devices/room_control": {"temperature": 26.5}} into Firebase
+    multi-path update form: {"devices/room_control/temperature": 26.5}
+    so one PATCH writes every queued field atomically.
+    """
+    flat = {}
+    for path, payload in snapshot.items():
+        prefix = path.strip("/")
+        for key, value in payload.items():
+            flat[f"{prefix}/{key}"] = value
+    return flat
+
+async def _flush_main():
+    global _flush_loop, _flush_wakeup
+    # flush_now guards on _flush_loop, so the Event must exist before the
+    # loop reference is published or an early scan hits a None _flush_wakeup
+    _flush_wakeup = asyncio.Event()
+    _flush_loop = asyncio.get_running_loop()
+    url = f"{FIREBASE_URL}/.json"
+    async with httpx.AsyncClient(
+            http2=True, timeout=5,
+            limits=httpx.Limits(max_keepalive_connections=4)) as client:
+        while True:
+            try:
+                await asyncio.wait_for(_flush_wakeup.wait(), FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _flush_wakeup.clear()
+            with pending_lock:
+                if not pending_updates:
+                    continue
+                snapshot = dict(pending_updates)
+                pending_updates.clear()
+            try:
+                r = await client.patch(url, content=orjson.dumps(flatten_to_multipath(snapshot)),
+                                       headers=JSON_HEADERS)
+                r.raise_for_status()
+            except Exception as e:
+                log.error("[FB FLUSH ERROR] %s", e)
+
+def flush_worker():
+    asyncio.run(_flush_main())
+
+# -------------------------
+# Firebase change stream
+# -------------------------
+# Instead of polling with fb_get, subscribe to the RTDB event stream so the
+# in-memory state also tracks changes made outside this broker (e.g. edits
+# from the Firebase console). Push beats re-fetching on every read.
+def _merge_stream_event(path, value):
+    """Merge a streamed {path, data} event under /devices into state."""
+    parts = [p for p in path.split("/") if p]
+    if not parts:
+        # root put: replace the nodes we track
+        if isinstance(value, dict):
+            for key in state:
+                if isinstance(value.get(key), dict):
+                    state[key].update(value[key])
+        return
+    node = parts[0]
+    if node not in state:
+        return
+    target = state[node]
+    for part in parts[1:-1]:
+        target = target.setdefault(part, {})
+        if not isinstance(target, dict):
+            return
+    if len(parts) == 1:
+        if isinstance(value, dict):
+            target.update(value)
+    else:
+        target[parts[-1]] = value
+
+def firebase_stream_worker():
+    url = f"{FIREBASE_URL}/devices.json"
+    while True:
+        try:
+            r = fb_session.get(url, stream=True,
+                               headers={"Accept": "text/event-stream"},
+                               timeout=(5, None))
+            r.raise_for_status()
+            log.info("[FB STREAM] Connected")
+            for event in sseclient.SSEClient(r).events():
+                if event.event not in ("put", "patch"):
+                    continue
+                body = orjson.loads(event.data)
+                with state_lock:
+                    _merge_stream_event(body.get("path", "/"), body.get("data"))
+                    publish_snapshot()
+        except Exception as e:
+            log.error("[FB STREAM] Disconnected: %s", e)
+        time.sleep(5)
+
 # -------------------------
 # Ensure initial schema
 # -------------------------
@@ -102,16 +289,53 @@ def ensure_schema():
                 "updated_at": int(time.time())
             }
         }
-        print("[INFO] Creating Firebase schema...")
+        log.info("[INFO] Creating Firebase schema...")
         fb_put(base, skeleton)
     else:
-        print("[INFO] Firebase schema exists.")
+        log.info("[INFO] Firebase schema exists.")
+
+# -------------------------
+# MQTT work queue
+# -------------------------
+# on_message only parses and validates; the actual handling (state updates,
+# Firebase queueing) runs on a small worker pool so a slow Firebase call can
+# never stall paho's network loop and make it drop messages under burst.
+WORKER_COUNT = 2
+
+work_q = queue.Queue(maxsize=1024)
+dropped_messages = 0
+
+def dispatch(topic, data, recv_time):
+    if topic == TOPIC_WEATHER_SENSOR:
+        handle_weather_sensor(data, recv_time)
+    elif topic == TOPIC_WEATHER_STATUS:
+        handle_weather_status(data, recv_time)
+    elif topic == TOPIC_LIGHT_STATUS:
+        handle_light_status(data, recv_time)
+
+def queue_worker():
+    while True:
+        topic, data, recv_time = work_q.get()
+        try:
+            dispatch(topic, data, recv_time)
+        except Exception as e:
+            log.error("[WORKER] Error handling %s: %s", topic, e)
+        finally:
+            work_q.task_done()
 
 # -------------------------
 # MQTT Handlers
 # -------------------------
 def on_connect(client, userdata, flags, rc):
-    print("[MQTT] Connected with rc=", rc)
+    log.info("[MQTT] Connected with rc=%s", rc)
+    # Disable Nagle so small grant/deny responses go out immediately
+    # instead of waiting up to 40 ms to coalesce, and widen the send buffer
+    try:
+        sock = client.socket()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+    except Exception as e:
+        log.warning("[MQTT] Socket tuning failed: %s", e)
     # UPDATED SUBSCRIPTIONS
     client.subscribe([
         (TOPIC_NFC_SCAN, 0),
@@ -119,32 +343,62 @@ def on_connect(client, userdata, flags, rc):
         (TOPIC_WEATHER_STATUS, 0),
         (TOPIC_LIGHT_STATUS, 0)
     ])
-    print("[MQTT] Subscribed to topics:")
-    print(f"  - {TOPIC_NFC_SCAN}")
-    print(f"  - {TOPIC_WEATHER_SENSOR}")
-    print(f"  - {TOPIC_WEATHER_STATUS}")
-    print(f"  - {TOPIC_LIGHT_STATUS}")
+    log.info("[MQTT] Subscribed to %s, %s, %s, %s",
+             TOPIC_NFC_SCAN, TOPIC_WEATHER_SENSOR,
+             TOPIC_WEATHER_STATUS, TOPIC_LIGHT_STATUS)
 
 def on_message(client, userdata, msg):
     try:
-        payload = msg.payload.decode()
         topic = msg.topic
-        print(f"[MQTT] {topic} -> {payload}")
-        data = json.loads(payload)
+        # orjson parses the payload bytes directly; no str copy via .decode()
+        data = orjson.loads(msg.payload)
+        log.debug("[MQTT] %s -> %s", topic, msg.payload)
     except Exception as e:
-        print("[MQTT] Bad message:", e)
+        log.warning("[MQTT] Bad message: %s", e)
         return
 
+    # One clock read per message; handlers take it as an argument instead
+    # of each issuing their own time.time() syscall.
+    now = int(time.time())
+
     if topic == TOPIC_NFC_SCAN:
-        handle_nfc_scan(data)
-    elif topic == TOPIC_WEATHER_SENSOR:
-        handle_weather_sensor(data)
-    elif topic == TOPIC_WEATHER_STATUS:
-        handle_weather_status(data)
-    elif topic == TOPIC_LIGHT_STATUS:
-        handle_light_status(data)
+        # Door responses are latency sensitive: publish the grant/deny from
+        # here (the Firebase writes it queues are flushed asynchronously).
+        handle_nfc_scan(data, now)
+        return
 
-def handle_nfc_scan(data):
+    global dropped_messages
+    try:
+        work_q.put_nowait((topic, data, now))
+    except queue.Full:
+        dropped_messages += 1
+        log.warning("[MQTT] Work queue full, dropped message #%d (%s)", dropped_messages, topic)
+        enqueue("/devices/broker", {"dropped": dropped_messages})
+
+# Fixed-shape access responses: splice the dynamic fields into a pre-encoded
+# bytes template instead of building a dict and JSON-encoding it per scan.
+# Only safe for fields that need no JSON escaping; _json_safe checks that,
+# and anything else falls back to a real encoder.
+GRANT_TMPL = b'{"access":"granted","nfc_uid":"%s","device_id":"%s","timestamp":%d}'
+DENY_TMPL = b'{"access":"denied","nfc_uid":"%s","device_id":"%s","timestamp":%d}'
+
+def _json_safe(s):
+    """True when s can be spliced into a JSON template without escaping."""
+    return s.replace("_", "").replace("-", "").isalnum()
+
+def _access_resp(approved, uid, device_id, now):
+    if _json_safe(uid) and _json_safe(device_id):
+        tmpl = GRANT_TMPL if approved else DENY_TMPL
+        return tmpl % (uid.encode(), device_id.encode(), now)
+    # uid or device_id carries characters that would need escaping
+    return orjson.dumps({
+        "access": "granted" if approved else "denied",
+        "nfc_uid": uid,
+        "device_id": device_id,
+        "timestamp": now
+    })
+
+def handle_nfc_scan(data, now):
     """
     UPDATED: Handle NFC scan from esp/nfc/scan
     expected data:
@@ -156,69 +410,63 @@ def handle_nfc_scan(data):
     }
     """
     uid = str(data.get("nfc_uid","")).upper()
-    device_id = data.get("device_id", "unknown")
+    device_id = str(data.get("device_id", "unknown"))
     
     if uid == "":
-        print("[NFC] Empty UID")
+        log.warning("[NFC] Empty UID")
         return
 
-    now = int(time.time())
+    # Check allowed_uids first; the formatted banner only runs when enabled
+    approved = uid in ALLOWED_UIDS
 
-    print(f"\n{'='*50}")
-    print(f"[NFC SCAN] Device: {device_id}")
-    print(f"[NFC SCAN] UID: {uid}")
-    print(f"[NFC SCAN] Checking access...")
+    if LOG_NFC:
+        log.info("[NFC SCAN] Device: %s UID: %s - checking access...", device_id, uid)
 
-    # Check allowed_uids
-    approved = uid in ALLOWED_UIDS
     if approved:
-        print(f"[ACCESS] ✓ UID {uid} AUTHORIZED - Granting access")
+        if LOG_NFC:
+            log.info("[ACCESS] ✓ UID %s AUTHORIZED - Granting access", uid)
         # update last_userid in memory and firebase
-        state["door_lock"]["last_userid"] = uid
-        state["door_lock"]["status"] = "unlocked"
-        state["door_lock"]["updated_at"] = now
-        state["room_control"]["last_userid"] = uid  # user now in room
-        state["room_control"]["updated_at"] = now
-
-        # Update firebase
-        fb_patch("/devices/door_lock", {
+        with state_lock:
+            state["door_lock"]["last_userid"] = uid
+            state["door_lock"]["status"] = "unlocked"
+            state["door_lock"]["updated_at"] = now
+            state["room_control"]["last_userid"] = uid  # user now in room
+            state["room_control"]["updated_at"] = now
+            publish_snapshot()
+
+        # Update firebase (flushed immediately - access latency matters)
+        enqueue("/devices/door_lock", {
             "status": "unlocked",
             "last_userid": uid,
             "updated_at": now
         })
-        fb_patch("/devices/room_control", {
+        enqueue("/devices/room_control", {
             "last_userid": uid,
             "updated_at": now
         })
+        flush_now()
 
         # UPDATED: Send grant response to esp/nfc/response
-        resp = {
-            "access": "granted", 
-            "nfc_uid": uid,
-            "device_id": device_id,
-            "timestamp": now
-        }
-        mqtt_client.publish(TOPIC_NFC_RESPONSE, json.dumps(resp))
-        print(f"[MQTT] ✓ Published ACCESS GRANTED to {TOPIC_NFC_RESPONSE}")
+        resp = _access_resp(True, uid, device_id, now)
+        mqtt_client.publish(TOPIC_NFC_RESPONSE, resp)
+        if LOG_NFC:
+            log.info("[MQTT] ✓ Published ACCESS GRANTED to %s", TOPIC_NFC_RESPONSE)
     else:
-        print(f"[ACCESS] ✗ UID {uid} DENIED - Not in allowed list")
+        if LOG_NFC:
+            log.info("[ACCESS] ✗ UID %s DENIED - Not in allowed list", uid)
         # send deny
-        resp = {
-            "access": "denied", 
-            "nfc_uid": uid,
-            "device_id": device_id,
-            "timestamp": now
-        }
-        mqtt_client.publish(TOPIC_NFC_RESPONSE, json.dumps(resp))
-        print(f"[MQTT] ✗ Published ACCESS DENIED to {TOPIC_NFC_RESPONSE}")
+        resp = _access_resp(False, uid, device_id, now)
+        mqtt_client.publish(TOPIC_NFC_RESPONSE, resp)
+        if LOG_NFC:
+            log.info("[MQTT] ✗ Published ACCESS DENIED to %s", TOPIC_NFC_RESPONSE)
         # log to firebase
-        fb_patch("/devices/door_lock", {
+        enqueue("/devices/door_lock", {
             "last_attempt": uid,
             "last_attempt_at": now
         })
-    print(f"{'='*50}\n")
+        flush_now()
 
-def handle_weather_sensor(data):
+def handle_weather_sensor(data, now):
     """
     UPDATED: Handle weather sensor data from esp/weather/sensor
     expected:
@@ -232,24 +480,25 @@ def handle_weather_sensor(data):
     temp = data.get("temperature")
     hum = data.get("humidity")
     device_id = data.get("device_id", "unknown")
-    now = int(time.time())
-    
+
     if temp is not None or hum is not None:
-        state["room_control"]["temperature"] = temp
-        state["room_control"]["humidity"] = hum
-        state["room_control"]["updated_at"] = now
-        state["room_control"]["device_id"] = device_id
-        
-        # update firebase device node
-        fb_patch("/devices/room_control", {
+        with state_lock:
+            state["room_control"]["temperature"] = temp
+            state["room_control"]["humidity"] = hum
+            state["room_control"]["updated_at"] = now
+            state["room_control"]["device_id"] = device_id
+            publish_snapshot()
+
+        # update firebase device node (batched)
+        enqueue("/devices/room_control", {
             "temperature": temp,
             "humidity": hum,
             "device_id": device_id,
             "updated_at": now
         })
-        print(f"[SENSOR] 🌡️ Temp: {temp}°C | 💧 Humidity: {hum}% | Device: {device_id}")
+        log.debug("[SENSOR] Temp: %s°C | Humidity: %s%% | Device: %s", temp, hum, device_id)
 
-def handle_weather_status(data):
+def handle_weather_status(data, now):
     """
     UPDATED: Handle device status from esp/weather/status
     expected:
@@ -264,17 +513,13 @@ def handle_weather_status(data):
     """
     device_id = data.get("device_id", "unknown")
     status = data.get("status", "unknown")
-    now = int(time.time())
-    
-    print(f"\n[STATUS] Device: {device_id}")
-    print(f"         Status: {status}")
-    print(f"         WiFi RSSI: {data.get('wifi_rssi')} dBm")
-    print(f"         NFC Available: {data.get('nfc_available')}")
-    print(f"         Display Available: {data.get('display_available')}")
-    print(f"         Uptime: {data.get('uptime')} seconds\n")
-    
-    # Store device status in Firebase
-    fb_patch(f"/devices/{device_id}/status", {
+
+    log.info("[STATUS] Device: %s status=%s rssi=%s dBm nfc=%s display=%s uptime=%ss",
+             device_id, status, data.get("wifi_rssi"), data.get("nfc_available"),
+             data.get("display_available"), data.get("uptime"))
+
+    # Store device status in Firebase (batched)
+    enqueue(f"/devices/{device_id}/status", {
         "online": status == "online",
         "wifi_rssi": data.get("wifi_rssi"),
         "nfc_available": data.get("nfc_available"),
@@ -283,18 +528,19 @@ def handle_weather_status(data):
         "last_seen": now
     })
 
-def handle_light_status(data):
+def handle_light_status(data, now):
     """
     expected:
     { "device_id":"light", "mode":"off" / "low"/"med"/"high" }
     """
     mode = data.get("mode")
-    now = int(time.time())
     if mode:
-        state["room_control"]["light_mode"] = mode
-        state["room_control"]["updated_at"] = now
-        fb_patch("/devices/room_control", {"light_mode": mode, "updated_at": now})
-        print(f"[LIGHT] 💡 Mode updated: {mode}")
+        with state_lock:
+            state["room_control"]["light_mode"] = mode
+            state["room_control"]["updated_at"] = now
+            publish_snapshot()
+        enqueue("/devices/room_control", {"light_mode": mode, "updated_at": now})
+        log.debug("[LIGHT] Mode updated: %s", mode)
 
 # -------------------------
 # MQTT client setup
@@ -302,11 +548,12 @@ def handle_light_status(data):
 mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
-
-def mqtt_loop():
-    print(f"[MQTT] Connecting to broker at {MQTT_BROKER}:{MQTT_PORT}...")
-    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    mqtt_client.loop_forever()
+# Widen the inflight/queued windows so bursty NFC and sensor traffic is not
+# throttled by paho's conservative defaults
+mqtt_client.max_inflight_messages_set(64)
+mqtt_client.max_queued_messages_set(2048)
+# Back off between 1s and 30s when the broker drops the connection
+mqtt_client.reconnect_delay_set(min_delay=1, max_delay=30)
 
 # -------------------------
 # Flask web app
@@ -319,7 +566,6 @@ DASH_TEMPLATE = """
 <html>
 <head>
   <title>Smart Room Dashboard</title>
-  <meta http-equiv="refresh" content="30">
   <meta charset="UTF-8">
   <style>
     * { margin: 0; padding: 0; box-sizing: border-box; }
@@ -504,29 +750,29 @@ DASH_TEMPLATE = """
     
     <div class="status-bar">
       <div class="user">
-        👤 Current User: <strong>{{ last_user }}</strong>
+        👤 Current User: <strong id="last-user">{{ last_user }}</strong>
       </div>
       <div class="door">
-        🚪 Door: <strong>{{ door_status|upper }}</strong>
+        🚪 Door: <strong id="door-status">{{ door_status|upper }}</strong>
       </div>
     </div>
     
     <div class="sensor-grid">
       <div class="sensor-card temp">
         <h3>🌡️ Temperature</h3>
-        <div class="value">{{ temp }}</div>
+        <div class="value" id="temp-value">{{ temp }}</div>
         <div>degrees Celsius</div>
       </div>
       
       <div class="sensor-card humid">
         <h3>💧 Humidity</h3>
-        <div class="value">{{ hum }}</div>
+        <div class="value" id="hum-value">{{ hum }}</div>
         <div>percent</div>
       </div>
       
       <div class="sensor-card light">
         <h3>💡 Light</h3>
-        <div class="value">{{ light|upper }}</div>
+        <div class="value" id="light-value">{{ light|upper }}</div>
         <div>current mode</div>
       </div>
     </div>
@@ -534,9 +780,7 @@ DASH_TEMPLATE = """
     <div class="allowed-uids">
       <h4>📋 Authorized NFC Cards</h4>
       <div class="uid-list">
-        {% for uid in allowed_uids %}
-        <span class="uid-tag">{{ uid }}</span>
-        {% endfor %}
+        {{ allowed_uids_html }}
       </div>
     </div>
 
@@ -573,36 +817,78 @@ DASH_TEMPLATE = """
     {% endwith %}
     
     <div class="footer">
-      <p>🔄 Page auto-refreshes every 30 seconds</p>
+      <p>🔄 Live updates pushed from the server</p>
       <p>System Time: {{ current_time }}</p>
     </div>
   </div>
+  <script>
+    // Server pushes a state snapshot only when something actually changed;
+    // no more full page reloads every 30 seconds.
+    const es = new EventSource("/events");
+    es.onmessage = (e) => {
+      const s = JSON.parse(e.data);
+      const rc = s.room_control, dl = s.door_lock;
+      document.getElementById("last-user").textContent = rc.last_userid || "None";
+      document.getElementById("door-status").textContent = (dl.status || "locked").toUpperCase();
+      document.getElementById("temp-value").textContent =
+        rc.temperature != null ? Number(rc.temperature).toFixed(1) + "°C" : "N/A";
+      document.getElementById("hum-value").textContent =
+        rc.humidity != null ? Number(rc.humidity).toFixed(1) + "%" : "N/A";
+      document.getElementById("light-value").textContent = (rc.light_mode || "off").toUpperCase();
+    };
+  </script>
 </body>
 </html>
 """
 
+# Compile the template once at import; render_template_string would re-lex
+# and re-compile the whole template string on every request.
+_DASH = app.jinja_env.from_string(DASH_TEMPLATE)
+
+# The allowed-UID list never changes at runtime, so sort, escape and render
+# the card tags once instead of on every dashboard request.
+ALLOWED_UIDS_HTML = Markup("".join(
+    f'<span class="uid-tag">{escape(u)}</span>' for u in sorted(ALLOWED_UIDS)
+))
+
+def _state_etag(snap):
+    """Weak ETag from the snapshot's version counter.
+
+    A counter distinguishes two updates landing in the same second, which
+    whole-second updated_at stamps cannot.
+    """
+    return 'W/"{}"'.format(snap.get("_version", 0))
+
 @app.route("/")
 def index():
-    last = state["room_control"].get("last_userid") or "None"
-    temp = state["room_control"].get("temperature")
-    hum = state["room_control"].get("humidity")
-    light = state["room_control"].get("light_mode") or "off"
-    door_status = state["door_lock"].get("status", "locked")
+    # Auto-refreshing tabs send If-None-Match; answer 304 when nothing
+    # changed so idle viewers cost a header exchange instead of a render.
+    # Pending flash messages must bypass this or the user never sees them.
+    snap = state_snapshot
+    etag = _state_etag(snap)
+    if "_flashes" not in session and request.headers.get("If-None-Match") == etag:
+        return "", 304, {"ETag": etag}
+
+    last = snap["room_control"].get("last_userid") or "None"
+    temp = snap["room_control"].get("temperature")
+    hum = snap["room_control"].get("humidity")
+    light = snap["room_control"].get("light_mode") or "off"
+    door_status = snap["door_lock"].get("status", "locked")
     
     # Format values
     temp_str = f"{temp:.1f}°C" if temp is not None else "N/A"
     hum_str = f"{hum:.1f}%" if hum is not None else "N/A"
     
-    return render_template_string(
-        DASH_TEMPLATE, 
-        last_user=last, 
-        temp=temp_str, 
-        hum=hum_str, 
+    html = _DASH.render(
+        last_user=last,
+        temp=temp_str,
+        hum=hum_str,
         light=light,
         door_status=door_status,
-        allowed_uids=sorted(ALLOWED_UIDS),
+        allowed_uids_html=ALLOWED_UIDS_HTML,
         current_time=time.strftime("%Y-%m-%d %H:%M:%S")
     )
+    return html, 200, {"ETag": etag}
 
 @app.route("/toggle_light", methods=["POST"])
 def toggle_light():
@@ -613,7 +899,7 @@ def toggle_light():
         flash("❌ UID required.")
         return redirect(url_for("index"))
     
-    current_last = state["room_control"].get("last_userid")
+    current_last = state_snapshot["room_control"].get("last_userid")
     
     if uid != current_last:
         flash(f"❌ Access denied. You ({uid}) are not the current user in the room. Current user: {current_last}")
@@ -621,19 +907,48 @@ def toggle_light():
     
     # forward command to light ESP
     cmd = {"device_id":"light", "mode": mode, "requested_by": uid}
-    mqtt_client.publish(TOPIC_LIGHT_CMD, json.dumps(cmd))
+    mqtt_client.publish(TOPIC_LIGHT_CMD, orjson.dumps(cmd))
     flash(f"✅ Light change requested: {mode.upper()}")
-    print(f"[WEB] User {uid} requested light mode: {mode}")
+    log.info("[WEB] User %s requested light mode: %s", uid, mode)
     return redirect(url_for("index"))
 
 @app.route("/api/status")
 def api_status():
     """API endpoint to get current system status"""
-    return {
-        "door_lock": state["door_lock"],
-        "room_control": state["room_control"],
+    snap = state_snapshot
+    etag = _state_etag(snap)
+    if request.headers.get("If-None-Match") == etag:
+        return "", 304, {"ETag": etag}
+    resp = jsonify({
+        "door_lock": snap["door_lock"],
+        "room_control": snap["room_control"],
         "timestamp": int(time.time())
-    }
+    })
+    resp.headers["ETag"] = etag
+    return resp
+
+@app.route("/events")
+def events():
+    """SSE stream: pushes a state snapshot whenever it actually changes."""
+    def stream():
+        last_etag = None
+        while True:
+            snap = state_snapshot
+            etag = _state_etag(snap)
+            if etag != last_etag:
+                last_etag = etag
+                payload = orjson.dumps({
+                    "door_lock": snap["door_lock"],
+                    "room_control": snap["room_control"],
+                }).decode()
+                yield f"data: {payload}\n\n"
+            else:
+                # comment frame: the write fails for disconnected clients,
+                # which is the only way waitress notices and frees the thread
+                yield ": keep-alive\n\n"
+            with state_cond:
+                state_cond.wait(timeout=30)
+    return Response(stream(), mimetype="text/event-stream")
 
 @app.route("/api/send_command", methods=["POST"])
 def api_send_command():
@@ -645,7 +960,7 @@ def api_send_command():
         return {"status": "error", "message": "Command required"}, 400
     
     cmd = {"command": command, "timestamp": int(time.time())}
-    mqtt_client.publish(TOPIC_WEATHER_CONTROL, json.dumps(cmd))
+    mqtt_client.publish(TOPIC_WEATHER_CONTROL, orjson.dumps(cmd))
     return {"status": "sent", "command": command}
 
 # -------------------------
@@ -664,10 +979,25 @@ if __name__ == "__main__":
     print("\n[START] Ensuring Firebase schema...")
     ensure_schema()
 
-    # start mqtt loop thread
-    t = threading.Thread(target=mqtt_loop, daemon=True)
-    t.start()
-    print("\n[START] ✓ MQTT loop started")
+    # start firebase flush worker thread
+    threading.Thread(target=flush_worker, daemon=True).start()
+    print("\n[START] ✓ Firebase flush worker started")
+
+    # start message handling worker pool
+    for _ in range(WORKER_COUNT):
+        threading.Thread(target=queue_worker, daemon=True).start()
+    print(f"[START] ✓ {WORKER_COUNT} message workers started")
+
+    # start firebase change stream
+    threading.Thread(target=firebase_stream_worker, daemon=True).start()
+    print("[START] ✓ Firebase change stream started")
+
+    # paho's own network-loop thread handles reconnects with backoff;
+    # connect_async keeps startup from blocking if the broker is down
+    print(f"[MQTT] Connecting to broker at {MQTT_BROKER}:{MQTT_PORT}...")
+    mqtt_client.connect_async(MQTT_BROKER, MQTT_PORT, 60)
+    mqtt_client.loop_start()
+    print("[START] ✓ MQTT loop started")
     print(f"\n[MQTT] Subscribed topics:")
     print(f"  📥 {TOPIC_NFC_SCAN}")
     print(f"  📥 {TOPIC_WEATHER_SENSOR}")
@@ -680,7 +1010,10 @@ if __name__ == "__main__":
     host = web_cfg.get("host", "0.0.0.0")
     port = int(web_cfg.get("port", 5000))
     
-    print(f"\n[WEB] Starting Flask dashboard on http://{host}:{port}")
+    print(f"\n[WEB] Starting dashboard on http://{host}:{port} (waitress, 8 threads)")
     print("="*60 + "\n")
-    
-    app.run(host=host, port=port, debug=False)
+
+    # Production WSGI server with a thread pool: concurrent dashboard
+    # refreshes no longer serialize behind Werkzeug's dev server. Each open
+    # /events stream holds a thread, hence the wider pool.
+    serve(app, host=host, port=port, threads=8, connection_limit=200)